@@ -7,11 +7,20 @@ import time
 import os
 import requests
 import nltk
+import argparse
+import glob
+from collections import deque
+from contextlib import contextmanager
 from textblob import TextBlob
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from datetime import datetime
 
+# Share the upstream cache with appserver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'data'))
+from upstream_cache import TTLCache, canonical_key, negative_key
+from latency_stats import percentile
+
 
 # Download required NLTK resources
 def download_nltk_resources():
@@ -27,13 +36,129 @@ def download_nltk_resources():
 
 download_nltk_resources()
 
+# Upstream API base URLs, overridable for local stubs and load tests
+NEWS_API_BASE_URL = os.getenv('NEWS_API_BASE_URL', 'https://newsapi.org/v2').rstrip('/')
+OPENWEATHERMAP_BASE_URL = os.getenv('OPENWEATHERMAP_BASE_URL', 'https://api.openweathermap.org/data/2.5').rstrip('/')
+
+# Per-turn stage timings, written as JSON lines (one object per turn) or as
+# a Chrome trace (load the file in chrome://tracing or Perfetto)
+class TurnTracer:
+    def __init__(self, path=None, trace_format='jsonl', enabled=None):
+        self.path = path
+        self.trace_format = trace_format
+        # Spans are only timed when a trace file is requested unless enabled explicitly
+        self.enabled = bool(path) if enabled is None else enabled
+        self.origin = time.perf_counter()
+        self.turn_started = self.origin
+        self.turn = 0
+        self.turn_spans = []
+        self.chrome_events = []
+        self.durations = {}
+        if path and trace_format == 'jsonl':
+            open(path, 'w').close()
+
+    @contextmanager
+    def span(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            end = time.perf_counter()
+            span = {
+                "stage": stage,
+                "start_ms": round((start - self.origin) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3)
+            }
+            if failed:
+                span["error"] = True
+            self.turn_spans.append(span)
+
+    def start_turn(self):
+        self.turn += 1
+        self.turn_spans = []
+        self.turn_started = time.perf_counter()
+
+    def end_turn(self):
+        if not self.enabled:
+            return
+        for span in self.turn_spans:
+            self.durations.setdefault(span["stage"], []).append(span["duration_ms"])
+        if self.path and self.trace_format == 'chrome':
+            self.chrome_events.extend({
+                "name": span["stage"],
+                "ph": "X",
+                "ts": span["start_ms"] * 1000,
+                "dur": span["duration_ms"] * 1000,
+                "pid": os.getpid(),
+                "tid": 1,
+                "args": {"turn": self.turn, "error": span.get("error", False)}
+            } for span in self.turn_spans)
+        elif self.path:
+            record = {
+                "turn": self.turn,
+                "total_ms": round((time.perf_counter() - self.turn_started) * 1000, 3),
+                "spans": self.turn_spans
+            }
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        self.turn_spans = []
+
+    def close(self):
+        if self.path and self.trace_format == 'chrome':
+            with open(self.path, 'w') as f:
+                json.dump({"traceEvents": self.chrome_events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """Count, mean and p95 in milliseconds for every stage seen so far."""
+        stats = {}
+        for stage, durations in self.durations.items():
+            ordered = sorted(durations)
+            stats[stage] = {
+                "count": len(ordered),
+                "mean_ms": round(sum(ordered) / len(ordered), 3),
+                "p95_ms": percentile(ordered, 0.95)
+            }
+        return stats
+
+
+# Stand-in for pyttsx3 when there is no audio output device
+class SilentEngine:
+    def getProperty(self, name):
+        return []
+
+    def setProperty(self, name, value):
+        pass
+
+    def say(self, text):
+        pass
+
+    def save_to_file(self, text, path):
+        pass
+
+    def runAndWait(self):
+        pass
+
+
 class VoiceChatbot:
-    def __init__(self):
+    # Read-only bots never create or rewrite the training data file
+    read_only = False
+
+    def __init__(self, tracer=None, engine=None):
         # Initialize speech recognition
         self.recognizer = sr.Recognizer()
+        self.beep_enabled = True
+        self.calibration_seconds = 1
+        self.tracer = tracer or TurnTracer()
 
         # Initialize text-to-speech engine with female voice
-        self.engine = pyttsx3.init()
+        self.engine = engine or pyttsx3.init()
         voices = self.engine.getProperty('voices')
         for voice in voices:
             if 'female' in voice.name.lower():
@@ -43,8 +168,9 @@ class VoiceChatbot:
         # Load training data
         self.training_data = self.load_training_data()
 
-        # Initialize cache for API responses
-        self.api_cache = {}
+        # Initialize caches for API responses
+        self.news_cache = TTLCache()
+        self.weather_cache = TTLCache()
 
     def load_training_data(self):
         default_data = [
@@ -56,12 +182,13 @@ class VoiceChatbot:
         ]
 
         try:
-            os.makedirs('lib/data', exist_ok=True)
             file_path = 'lib/data/sample_data.json'
 
             if not os.path.exists(file_path):
-                with open(file_path, 'w') as f:
-                    json.dump(default_data, f, indent=4)
+                if not self.read_only:
+                    os.makedirs('lib/data', exist_ok=True)
+                    with open(file_path, 'w') as f:
+                        json.dump(default_data, f, indent=4)
                 return default_data
 
             with open(file_path, 'r') as f:     
@@ -70,6 +197,13 @@ class VoiceChatbot:
             print(f"Error loading training data: {e}")
             return default_data
 
+    def report_cache_stats(self):
+        for name, cache in (("news", self.news_cache), ("weather", self.weather_cache)):
+            stats = cache.stats()
+            print(f"{name} cache: hit ratio {stats['hit_ratio']:.2%} "
+                  f"({stats['hits']} hits, {stats['negative_hits']} cached failures, "
+                  f"{stats['misses']} misses)")
+
     def save_training_data(self):
         try:
             file_path = 'lib\data\sample_data.json'
@@ -91,9 +225,10 @@ class VoiceChatbot:
             print(f"Error in text preprocessing: {e}")
             return text
 
-    def fetch_news(self, url):
-        if url in self.api_cache:
-            return self.api_cache[url]
+    def fetch_news(self, topic, url):
+        cached = self.news_cache.get(canonical_key(topic), negative_key(topic))
+        if cached:
+            return cached
 
         try:
             response = requests.get(url, timeout=10)
@@ -102,21 +237,30 @@ class VoiceChatbot:
                 articles = data.get('articles', [])
                 news_summaries = [article['title'] for article in articles[:5]]
                 news_result = '\n'.join(news_summaries)
-                self.api_cache[url] = news_result
-                return news_result
-            return "No news available right now."
+                if news_result:
+                    self.news_cache.set(canonical_key(topic), news_result)
+                    return news_result
+            message = "No news available right now."
+            self.news_cache.set_negative(topic, message)
+            return message
         except Exception as e:
             print(f"Error fetching news: {e}")
-            return "Sorry, I couldn't fetch the news right now."
+            message = "Sorry, I couldn't fetch the news right now."
+            self.news_cache.set_negative(topic, message)
+            return message
 
     def speak(self, text):
         try:
             print(f"Bot: {text}")
-            self.engine.say(text)
-            self.engine.runAndWait()
+            with self.tracer.span('speak'):
+                self.synthesize(text)
         except Exception as e:
             print(f"Error in speech synthesis: {e}")
 
+    def synthesize(self, text):
+        self.engine.say(text)
+        self.engine.runAndWait()
+
     def play_beep(self):
         """Plays a short beep sound before listening."""
         try:
@@ -129,14 +273,26 @@ class VoiceChatbot:
         except Exception as e:
             print(f"Error playing beep sound: {e}")
 
+    def open_audio_source(self):
+        return sr.Microphone()
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio)
+
     def listen(self):
-        with sr.Microphone() as source:
-            self.play_beep()  # Play the beep sound before listening
+        with self.open_audio_source() as source:
+            if self.beep_enabled:
+                with self.tracer.span('beep'):
+                    self.play_beep()  # Play the beep sound before listening
             print("\nListening...")
-            self.recognizer.adjust_for_ambient_noise(source, duration=1)
+            if self.calibration_seconds:
+                with self.tracer.span('calibrate'):
+                    self.recognizer.adjust_for_ambient_noise(source, duration=self.calibration_seconds)
             try:
-                audio = self.recognizer.listen(source, timeout=5)
-                text = self.recognizer.recognize_google(audio)
+                with self.tracer.span('capture'):
+                    audio = self.recognizer.listen(source, timeout=5)
+                with self.tracer.span('recognize'):
+                    text = self.recognize(audio)
                 print(f"You said: {text}")
                 return text
             except sr.WaitTimeoutError:
@@ -153,10 +309,12 @@ class VoiceChatbot:
     def get_weather(self, city):
         """Fetch real-time weather details for a given city."""
         api_key = os.getenv("10c7044f2ad5a789668dfa1bf62a7ba9", "ca2a0c8d12743e7f48f12a7e480a6349")  # Replace with your actual OpenWeatherMap API key
-        url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
+        url = f"{OPENWEATHERMAP_BASE_URL}/weather?q={city}&appid={api_key}&units=metric"
 
-        if city in self.api_cache:  # Check cache to avoid redundant requests
-            return self.api_cache[city]
+        # Check cache to avoid redundant requests
+        cached = self.weather_cache.get(canonical_key(city), negative_key(city))
+        if cached:
+            return cached
 
         try:
             response = requests.get(url, timeout=10)
@@ -169,12 +327,18 @@ class VoiceChatbot:
                     f"Humidity: {data['main']['humidity']}%\n"
                     f"Wind Speed: {data['wind']['speed']} m/s"
                 )
-                self.api_cache[city] = weather_info  # Cache result
+                # Cache result under the city and the name OpenWeatherMap resolved it to
+                self.weather_cache.set(canonical_key(city), weather_info)
+                self.weather_cache.set(canonical_key(data['name']), weather_info)
                 return weather_info
-            return "Sorry, I couldn't get the weather details."
+            message = "Sorry, I couldn't get the weather details."
+            self.weather_cache.set_negative(city, message)
+            return message
         except requests.exceptions.RequestException as e:
             print(f"Error fetching weather: {e}")
-            return "Unable to fetch weather details at the moment."
+            message = "Unable to fetch weather details at the moment."
+            self.weather_cache.set_negative(city, message)
+            return message
 
     def get_time_and_date(self):
         """Fetch the current time and date."""
@@ -203,15 +367,15 @@ class VoiceChatbot:
 
         # Check for news-related queries
         if "business news" in cleaned_query:
-            return self.fetch_news("https://newsapi.org/v2/top-headlines?country=us&category=business&apiKey=4cc3bf0cc5424522a615d94250eff225")
+            return self.fetch_news("business", f"{NEWS_API_BASE_URL}/top-headlines?country=us&category=business&apiKey=4cc3bf0cc5424522a615d94250eff225")
         elif "tech news" in cleaned_query:
-            return self.fetch_news("https://newsapi.org/v2/top-headlines?sources=techcrunch&apiKey=4cc3bf0cc5424522a615d94250eff225")
+            return self.fetch_news("tech", f"{NEWS_API_BASE_URL}/top-headlines?sources=techcrunch&apiKey=4cc3bf0cc5424522a615d94250eff225")
         elif "domains" in cleaned_query:
-            return self.fetch_news("https://newsapi.org/v2/everything?domains=wsj.com&apiKey=4cc3bf0cc5424522a615d94250eff225")
+            return self.fetch_news("domains", f"{NEWS_API_BASE_URL}/everything?domains=wsj.com&apiKey=4cc3bf0cc5424522a615d94250eff225")
         elif "Apple" in cleaned_query:
-            return self.fetch_news("https://newsapi.org/v2/everything?q=apple&from=2025-02-12&to=2025-02-12&sortBy=popularity&apiKey=4cc3bf0cc5424522a615d94250eff225")
+            return self.fetch_news("apple", f"{NEWS_API_BASE_URL}/everything?q=apple&from=2025-02-12&to=2025-02-12&sortBy=popularity&apiKey=4cc3bf0cc5424522a615d94250eff225")
         elif "Tesla" in cleaned_query:
-            return self.fetch_news("https://newsapi.org/v2/everything?q=tesla&from=2025-01-13&sortBy=publishedAt&apiKey=4cc3bf0cc5424522a615d94250eff225")
+            return self.fetch_news("tesla", f"{NEWS_API_BASE_URL}/everything?q=tesla&from=2025-01-13&sortBy=publishedAt&apiKey=4cc3bf0cc5424522a615d94250eff225")
 
         best_match = None
         max_intersection = 0
@@ -225,35 +389,156 @@ class VoiceChatbot:
 
         if best_match:
             return best_match['response']
-        else:
-            self.speak("I don't know the answer to that. Can you give me the correct response?")
-            new_response = self.listen()
-            if new_response:
-                self.training_data.append({"query": query, "response": new_response})
-                self.save_training_data()
-                return "Thank you! I've learned something new. ask another question in botany. "
+
+        learned = self.learn_response(query)
+        if learned:
+            return learned
 
         return "I'm not sure how to respond to that. Could you rephrase it?"
 
+    def learn_response(self, query):
+        """Ask the user for the answer to an unknown query and save it."""
+        self.speak("I don't know the answer to that. Can you give me the correct response?")
+        new_response = self.listen()
+        if new_response:
+            self.training_data.append({"query": query, "response": new_response})
+            self.save_training_data()
+            return "Thank you! I've learned something new. ask another question in botany. "
+        return None
+
+    def has_more_input(self):
+        return True
+
+    def handle_turn(self):
+        """Listen, answer and speak once; returns False when the user quits."""
+        user_input = self.listen()
+        if user_input:
+            if any(word in user_input.lower() for word in ['quit', 'exit', 'goodbye', 'bye']):
+                self.speak("Goodbye! Have a great day!")
+                return False
+
+            with self.tracer.span('process_query'):
+                response = self.process_query(user_input)
+            self.speak(response)
+        return True
+
     def run(self):
         self.speak("Hello! I'm your voice assistant. How can I help you today?")
 
-        while True:
-            user_input = self.listen()
-            if user_input:
-                if any(word in user_input.lower() for word in ['quit', 'exit', 'goodbye', 'bye']):
-                    self.speak("Goodbye! Have a great day!")
-                    break
+        while self.has_more_input():
+            self.tracer.start_turn()
+            try:
+                keep_going = self.handle_turn()
+            finally:
+                self.tracer.end_turn()
+            if not keep_going:
+                break
 
-                response = self.process_query(user_input)
-                self.speak(response)
+
+class ReplayChatbot(VoiceChatbot):
+    """Headless bot that feeds recorded WAV files through listen() ->
+    process_query() -> speak() with the microphone, beep and speaker stubbed.
+
+    Each recording is exactly one turn: unknown queries get the fallback reply
+    instead of listening for a correction, and training data is never written.
+
+    With ``use_transcripts`` a sidecar ``<name>.txt`` next to each WAV stands
+    in for Google recognition, so replays run without network access. With
+    ``synthesis_dir`` pyttsx3 still renders every reply to a file, keeping
+    synthesis cost in the trace without needing an output device.
+    """
+    read_only = True
+
+    def __init__(self, wav_files, tracer=None, use_transcripts=False, synthesis_dir=None):
+        super().__init__(tracer=tracer, engine=pyttsx3.init() if synthesis_dir else SilentEngine())
+        self.beep_enabled = False
+        # Calibrating would consume the first second of each recording
+        self.calibration_seconds = 0
+        self.pending = deque(wav_files)
+        self.current_file = None
+        self.use_transcripts = use_transcripts
+        self.synthesis_dir = synthesis_dir
+        self.utterances = 0
+
+    def open_audio_source(self):
+        self.current_file = self.pending.popleft()
+        return sr.AudioFile(self.current_file)
+
+    def listen(self):
+        # An unreadable or corrupt recording ends its own turn, not the replay
+        try:
+            return super().listen()
+        except Exception as e:
+            print(f"Error reading recording {self.current_file}: {e}")
+            return None
+
+    def has_more_input(self):
+        return bool(self.pending)
+
+    def learn_response(self, query):
+        return None
+
+    def recognize(self, audio):
+        if self.use_transcripts:
+            # Never fall back to Google here: transcript replays run offline
+            transcript_path = os.path.splitext(self.current_file)[0] + '.txt'
+            if not os.path.exists(transcript_path):
+                raise FileNotFoundError(f"missing transcript {transcript_path}")
+            with open(transcript_path, 'r') as f:
+                text = f.read().strip()
+            if not text:
+                raise sr.UnknownValueError()
+            return text
+        return super().recognize(audio)
+
+    def synthesize(self, text):
+        if not self.synthesis_dir:
+            return
+        self.utterances += 1
+        path = os.path.join(self.synthesis_dir, f"reply_{self.utterances:04d}.wav")
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Voice Chatbot")
+    parser.add_argument('--trace', help="write per-turn stage timings to this file")
+    parser.add_argument('--trace-format', choices=['jsonl', 'chrome'], default='jsonl')
+    parser.add_argument('--replay', metavar='DIR',
+                        help="replay the WAV files in DIR headlessly instead of using the microphone")
+    parser.add_argument('--transcripts', action='store_true',
+                        help="in replay mode, use <name>.txt next to each WAV instead of Google recognition")
+    parser.add_argument('--synthesize-to', metavar='DIR',
+                        help="in replay mode, render replies with pyttsx3 into DIR instead of skipping synthesis")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    tracer = TurnTracer(args.trace, args.trace_format, enabled=bool(args.trace or args.replay))
+
+    if args.replay:
+        wav_files = sorted(glob.glob(os.path.join(args.replay, '*.wav')))
+        print(f"Replaying {len(wav_files)} recordings from {args.replay}...")
+        if args.synthesize_to:
+            os.makedirs(args.synthesize_to, exist_ok=True)
+        chatbot = ReplayChatbot(wav_files, tracer, args.transcripts, args.synthesize_to)
+        try:
+            chatbot.run()
+        finally:
+            tracer.close()
+        for stage, stats in tracer.summary().items():
+            print(f"{stage:<14} n={stats['count']:<5} mean={stats['mean_ms']:>9.1f} ms  p95={stats['p95_ms']:>9.1f} ms")
+        chatbot.report_cache_stats()
+        sys.exit(0)
+
     print("Starting Voice Chatbot...")
     print("Press Ctrl+C to exit")
-    chatbot = VoiceChatbot()
+    chatbot = VoiceChatbot(tracer)
     try:
         chatbot.run()
     except KeyboardInterrupt:
-        print("\nExiting Voice Chatbot...")
\ No newline at end of file
+        print("\nExiting Voice Chatbot...")
+    finally:
+        tracer.close()
+        chatbot.report_cache_stats()
\ No newline at end of file
@@ -10,17 +10,28 @@ from nltk.tokenize import word_tokenize
 from textblob import TextBlob
 from waitress import serve
 import urllib.parse
+import tempfile
 import time
 from functools import wraps
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from training_store import TrainingStore
+from upstream_cache import TTLCache, canonical_key, negative_key
 
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Upstream API base URLs, overridable for local stubs and load tests
+NEWS_API_BASE_URL = os.getenv('NEWS_API_BASE_URL', 'https://newsapi.org/v2').rstrip('/')
+WIKIPEDIA_API_BASE_URL = os.getenv('WIKIPEDIA_API_BASE_URL', 'https://en.wikipedia.org/api/rest_v1').rstrip('/')
+
+# Upstream cache lifetimes in seconds; 0 disables caching (used by load tests)
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', 600))
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv('NEGATIVE_CACHE_TTL_SECONDS', 60))
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -84,25 +95,8 @@ DEFAULT_TRAINING_DATA = [
 ]
 
 # Initialize caches with TTL
-class TTLCache:
-    def __init__(self, ttl_seconds=600):
-        self.cache = {}
-        self.ttl = ttl_seconds
-
-    def get(self, key):
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            if time.time() - timestamp < self.ttl:
-                return data
-            else:
-                del self.cache[key]
-        return None
-
-    def set(self, key, value):
-        self.cache[key] = (value, time.time())
-
-wikipedia_cache = TTLCache()
-news_cache = TTLCache()
+wikipedia_cache = TTLCache(CACHE_TTL_SECONDS, negative_ttl_seconds=NEGATIVE_CACHE_TTL_SECONDS)
+news_cache = TTLCache(CACHE_TTL_SECONDS, negative_ttl_seconds=NEGATIVE_CACHE_TTL_SECONDS)
 
 # Initialize training data
 def initialize_training_data():
@@ -126,8 +120,6 @@ def initialize_training_data():
         logger.error(f"Error initializing training data: {str(e)}")
         return DEFAULT_TRAINING_DATA
 
-training_data = initialize_training_data()
-
 # Improved text preprocessing
 def preprocess_text(text):
     try:
@@ -154,35 +146,58 @@ def preprocess_text(text):
         logger.error(f"Error in text preprocessing: {str(e)}")
         return text
 
+# Skip malformed entries saved before /train validated its input
+def valid_training_entries(entries):
+    for entry in entries:
+        if isinstance(entry, dict) and isinstance(entry.get('query'), str) \
+                and isinstance(entry.get('response'), str):
+            yield entry
+        else:
+            logger.warning(f"Skipping malformed training entry: {entry!r}")
+
+# Training entries are tokenized once here and kept in a compact columnar store
+training_data = TrainingStore.from_entries(
+    valid_training_entries(initialize_training_data()), tokenize=preprocess_text)
+
 # Improved Wikipedia fetching
 def fetch_from_wikipedia(query):
     try:
-        # Check cache first
-        cached_result = wikipedia_cache.get(query)
+        # Check cache first, including recent failures for this topic
+        cached_result = wikipedia_cache.get(canonical_key(query), negative_key(query))
         if cached_result:
             return cached_result
 
         encoded_query = urllib.parse.quote(query)
         response = requests.get(
-            f"https://en.wikipedia.org/api/rest_v1/page/summary/{encoded_query}",
+            f"{WIKIPEDIA_API_BASE_URL}/page/summary/{encoded_query}",
             timeout=10,
             headers={'User-Agent': 'ChatbotApp/1.0'}
         )
         response.raise_for_status()
 
         data = response.json()
-        extract = data.get('extract') or data.get('description') or 'No information available.'
-        
-        # Cache the result
-        wikipedia_cache.set(query, extract)
+        extract = data.get('extract') or data.get('description')
+        if not extract:
+            extract = 'No information available.'
+            wikipedia_cache.set_negative(query, extract)
+            return extract
+
+        # Cache the result under the topic and the title Wikipedia resolved it to
+        wikipedia_cache.set(canonical_key(query), extract)
+        if data.get('title'):
+            wikipedia_cache.set(canonical_key(data['title']), extract)
         return extract
 
     except requests.Timeout:
         logger.error("Wikipedia API request timed out")
-        return "Request timed out. Please try again later."
+        message = "Request timed out. Please try again later."
+        wikipedia_cache.set_negative(query, message)
+        return message
     except requests.RequestException as e:
         logger.error(f"Wikipedia API error: {str(e)}")
-        return "Sorry, I couldn't fetch Wikipedia data at the moment."
+        message = "Sorry, I couldn't fetch Wikipedia data at the moment."
+        wikipedia_cache.set_negative(query, message)
+        return message
     except Exception as e:
         logger.error(f"Unexpected error fetching Wikipedia data: {str(e)}")
         return "An unexpected error occurred while fetching information."
@@ -197,13 +212,13 @@ logger = logging.getLogger(__name__)
 def fetch_news(query=None, country="us", category="business"):
     try:
         # Generate cache key
-        cache_key = f"{query or category}-{country}"
-        cached_result = news_cache.get(cache_key)
+        cache_key = f"{canonical_key(query or category)}-{country.casefold()}"
+        cached_result = news_cache.get(cache_key, negative_key(cache_key))
         if cached_result:
             return cached_result
 
         api_key = os.getenv('NEWS_API_KEY', '4cc3bf0cc5424522a615d94250eff225')
-        base_url = "https://newsapi.org/v2"
+        base_url = NEWS_API_BASE_URL
 
         # Define multiple news sources based on category or query
         news_sources = {
@@ -226,7 +241,7 @@ def fetch_news(query=None, country="us", category="business"):
         }
 
         # Get URLs based on query or category
-        urls = news_sources.get(query.lower(), news_sources.get(category.lower(), []))
+        urls = news_sources.get((query or '').lower(), news_sources.get(category.lower(), []))
 
         all_articles = []
         for url in urls:
@@ -236,7 +251,9 @@ def fetch_news(query=None, country="us", category="business"):
             all_articles.extend(articles)
 
         if not all_articles:
-            return f"No news articles found for {query or category} in {country.upper()}."
+            message = f"No news articles found for {query or category} in {country.upper()}."
+            news_cache.set_negative(cache_key, message)
+            return message
 
         # Format results
         news_results = [f"📰 *Latest {query.capitalize() if query else category.capitalize()} News:*\n"]
@@ -249,12 +266,14 @@ def fetch_news(query=None, country="us", category="business"):
             )
 
         result = '\n'.join(news_results)
-        news_cache[cache_key] = result  # Cache result
+        news_cache.set(cache_key, result)  # Cache result
         return result
 
     except requests.RequestException as e:
         logger.error(f"News API request failed: {str(e)}")
-        return "Sorry, I couldn't fetch the news at the moment. Please try again later."
+        message = "Sorry, I couldn't fetch the news at the moment. Please try again later."
+        news_cache.set_negative(cache_key, message)
+        return message
     except Exception as e:
         logger.error(f"Unexpected error in fetch_news: {str(e)}")
         return "An unexpected error occurred while fetching news."
@@ -266,7 +285,7 @@ def fetch_news(query=None, country="us", category="business"):
             return cached_result
 
         # Construct the exact URL format
-        base_url = "https://newsapi.org/v2/top-headlines"
+        base_url = f"{NEWS_API_BASE_URL}/top-headlines"
         params = {
             'country': country,
             'category': category,
@@ -315,7 +334,7 @@ def fetch_news(query=None, country="us", category="business"):
             return cached_result
 
         api_key = os.getenv('NEWS_API_KEY')
-        base_url = "https://newsapi.org/v2"
+        base_url = NEWS_API_BASE_URL
         
         # Determine which endpoint to use
         if category or country:
@@ -406,14 +425,7 @@ def chat():
             return jsonify({"response": response, "source": "wikipedia"})
 
         # Find best matching response from training data
-        best_match = None
-        max_similarity = 0
-        
-        for entry in training_data:
-            similarity = len(set(preprocess_text(entry['query']).split()) & set(cleaned_query.split()))
-            if similarity > max_similarity:
-                max_similarity = similarity
-                best_match = entry
+        best_match, max_similarity = training_data.best_match(set(cleaned_query.split()))
 
         response = best_match['response'] if best_match else "I don't understand. Could you rephrase that?"
         
@@ -433,9 +445,12 @@ def chat():
 def train():
     try:
         new_data = request.get_json()
-        if not new_data or 'query' not in new_data or 'response' not in new_data:
+        if not isinstance(new_data, dict) or 'query' not in new_data or 'response' not in new_data:
             return jsonify({"error": "Invalid training data format"}), 400
 
+        if not isinstance(new_data['query'], str) or not isinstance(new_data['response'], str):
+            return jsonify({"error": "Query and response must be strings"}), 400
+
         if new_data.get('source') in ['wikipedia', 'news']:
             return jsonify({"error": "External data cannot be saved to training data"}), 400
 
@@ -444,8 +459,16 @@ def train():
         data_dir = 'lib/data'
         file_path = os.path.join(data_dir, 'training_data.json')
         
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(training_data, file, indent=4)
+        # Stream entries to a private temp file and swap it in, so concurrent
+        # /train requests never interleave writes to the same file
+        fd, temp_path = tempfile.mkstemp(dir=data_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                training_data.write_json(file)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
 
         logger.info(f"Added new training data: {new_data['query']}")
         return jsonify({"message": "Training data updated successfully"})
@@ -460,16 +483,21 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "training_data_size": len(training_data)
+        "training_data_size": len(training_data),
+        "cache_stats": {
+            "wikipedia": wikipedia_cache.stats(),
+            "news": news_cache.stats()
+        }
     })
 
 if __name__ == '__main__':
     try:
-        logger.info("Server starting on http://0.0.0.0:5000")
+        port = int(os.getenv('PORT', 5000))
+        logger.info(f"Server starting on http://0.0.0.0:{port}")
         if os.environ.get('FLASK_ENV') == 'development':
-            app.run(host='0.0.0.0', port=5000, debug=True)
+            app.run(host='0.0.0.0', port=port, debug=True)
         else:
-            serve(app, host='0.0.0.0', port=5000)
+            serve(app, host='0.0.0.0', port=port)
     except Exception as e:
         logger.error(f"Failed to start server: {str(e)}")
         raise
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Replay a synthetic Wikipedia topic stream against the old raw-key cache
+policy and the canonical-key + negative-cache policy, and report hit ratios.
+
+    python lib/lib/data/bench_cache_keys.py --requests 20000
+"""
+import argparse
+import random
+
+from upstream_cache import TTLCache, canonical_key, negative_key
+
+# Topic -> title the upstream resolves it to (redirects included)
+KNOWN_TOPICS = {
+    "python": "Python",
+    "python programming language": "Python (programming language)",
+    "new york": "New York City",
+    "new york city": "New York City",
+    "machine learning": "Machine learning",
+    "black hole": "Black hole",
+    "solar system": "Solar System",
+    "jupiter": "Jupiter",
+    "photosynthesis": "Photosynthesis",
+    "world war ii": "World War II",
+}
+UNKNOWN_TOPICS = ["asdfgh", "qwerty zxc", "plumbus", "flurbo exchange"]
+
+
+# Spelling variants the preprocessing step lets through
+def variant(topic, rng):
+    words = topic.split()
+    choice = rng.randrange(4)
+    if choice == 1:
+        words = [word.capitalize() for word in words]
+    elif choice == 2:
+        return '  '.join(words) + ' '
+    elif choice == 3 and len(words) > 1:
+        rng.shuffle(words)
+    return ' '.join(words)
+
+
+def upstream(topic):
+    title = KNOWN_TOPICS.get(' '.join(topic.casefold().split()))
+    if title is None:
+        raise LookupError(404)
+    return title, f"Summary of {title}"
+
+
+def replay_raw(stream):
+    cache = TTLCache()
+    calls = 0
+    for topic in stream:
+        if cache.get(topic):
+            continue
+        calls += 1
+        try:
+            _, extract = upstream(topic)
+        except LookupError:
+            continue
+        cache.set(topic, extract)
+    return cache.stats(), calls
+
+
+def replay_canonical(stream):
+    cache = TTLCache()
+    calls = 0
+    for topic in stream:
+        if cache.get(canonical_key(topic), negative_key(topic)):
+            continue
+        calls += 1
+        try:
+            title, extract = upstream(topic)
+        except LookupError:
+            cache.set_negative(topic, "Sorry, I couldn't fetch Wikipedia data at the moment.")
+            continue
+        cache.set(canonical_key(topic), extract)
+        cache.set(canonical_key(title), extract)
+    return cache.stats(), calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--unknown-share', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topics = list(KNOWN_TOPICS)
+    stream = []
+    for _ in range(args.requests):
+        pool = UNKNOWN_TOPICS if rng.random() < args.unknown_share else topics
+        stream.append(variant(rng.choice(pool), rng))
+
+    for name, replay in (("raw keys", replay_raw), ("canonical + negative", replay_canonical)):
+        stats, calls = replay(stream)
+        print(f"{name:22} hit ratio {stats['hit_ratio']:.4f}  "
+              f"cached failures {stats['negative_hits']:6}  "
+              f"upstream calls {calls:6}  cache size {stats['size']}")
+
+
+if __name__ == '__main__':
+    main()
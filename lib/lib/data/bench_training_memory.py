@@ -0,0 +1,91 @@
+"""Compare bytes per training entry for the plain list-of-dicts layout and
+the columnar TrainingStore.
+
+    python lib/lib/data/bench_training_memory.py --entries 200000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tracemalloc
+
+from training_store import TrainingStore
+
+WORDS = ("weather news python train schedule account balance loan card bank "
+         "transfer open close branch hours interest rate deposit savings help "
+         "password reset login mobile app payment bill statement fee limit").split()
+
+
+# Build a JSON document shaped like lib/data/training_data.json. Responses are
+# drawn from a fixed pool since trained bots repeat a small set of answers.
+def make_training_json(entries, distinct_responses, seed=0):
+    rng = random.Random(seed)
+    responses = [f"Canned answer number {i}: " + ' '.join(rng.choices(WORDS, k=12))
+                 for i in range(distinct_responses)]
+    data = [
+        {"query": ' '.join(rng.choices(WORDS, k=rng.randint(3, 8))),
+         "response": rng.choice(responses)}
+        for _ in range(entries)
+    ]
+    return json.dumps(data)
+
+
+# Bytes still allocated after building an object from scratch, and the
+# peak traced while building it
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size, peak
+
+
+# Persist the store the way /train used to and the way it does now
+def dump_list(store):
+    with open(os.devnull, 'w', encoding='utf-8') as file:
+        json.dump(store.to_list(), file, indent=4)
+
+
+def dump_streamed(store):
+    with open(os.devnull, 'w', encoding='utf-8') as file:
+        store.write_json(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--distinct-responses', type=int, default=500)
+    args = parser.parse_args()
+
+    text = make_training_json(args.entries, args.distinct_responses)
+
+    plain, plain_bytes, plain_peak = measure(lambda: json.loads(text))
+    del plain
+    # The old /chat path rebuilt these per request; count them for reference
+    token_sets, token_set_bytes, token_set_peak = measure(
+        lambda: [set(entry['query'].split()) for entry in json.loads(text)])
+    del token_sets
+    store, store_bytes, store_peak = measure(lambda: TrainingStore.from_entries(json.loads(text)))
+    _, _, list_dump_peak = measure(lambda: dump_list(store))
+    _, _, stream_dump_peak = measure(lambda: dump_streamed(store))
+
+    assert len(store) == args.entries
+    count = args.entries
+    print(f"entries:                     {args.entries}")
+    print(f"distinct responses:          {args.distinct_responses}")
+    print(f"{'bytes/entry':<28} {'retained':>9} {'peak':>9}")
+    print(f"{'list of dicts':<28} {plain_bytes / count:9.1f} {plain_peak / count:9.1f}")
+    print(f"{'per-request token sets':<28} {token_set_bytes / count:9.1f} {token_set_peak / count:9.1f}")
+    print(f"{'TrainingStore (with tokens)':<28} {store_bytes / count:9.1f} {store_peak / count:9.1f}")
+    print(f"{'/train persist, to_list':<28} {'':>9} {list_dump_peak / count:9.1f}")
+    print(f"{'/train persist, streamed':<28} {'':>9} {stream_dump_peak / count:9.1f}")
+    print(f"reduction vs list of dicts:  {plain_bytes / store_bytes:8.1f}x retained")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+import math
+
+
+# Nearest-rank percentile of an already sorted sequence: the smallest value
+# with at least ``fraction`` of the samples at or below it. Shared by the
+# load test report and the voice bot's per-stage turn summary.
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Round first so float noise (0.07 * 100 == 7.000000000000001) can't bump the rank
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[min(len(sorted_values) - 1, max(0, rank - 1))]
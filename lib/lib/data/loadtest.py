@@ -0,0 +1,365 @@
+"""End-to-end load test for appserver.py against local stand-in upstreams.
+
+Starts stub NewsAPI and Wikipedia servers with scriptable latency, error
+rate and payload size, launches appserver.py pointed at them in a scratch
+working directory, drives a mix of concurrent /chat and /train requests and
+reports throughput, p50/p95/p99 latency and error rate per source.
+
+By default the appserver keeps its usual upstream caches, so after the first
+request per topic the news and Wikipedia rows measure cache hits and the
+stub latency, error-rate and payload knobs barely register. Pass
+--cache-ttl 0 to send every request upstream, or --wiki-topics to widen the
+key space.
+
+Weather is out of scope: appserver.py never calls OpenWeatherMap, only the
+voice bot in lib/chatbot_api.py does.
+
+    python lib/lib/data/loadtest.py --requests 2000 --concurrency 16 \\
+        --cache-ttl 0 --wiki-latency-ms 120 --wiki-error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from latency_stats import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(HERE, '..', '..', '..'))
+NEWS_SEED_FILE = os.path.join(REPO_ROOT, 'news_cache', 'all.json')
+TRAINING_DATA_FILE = os.path.join(REPO_ROOT, 'lib', 'data', 'training_data.json')
+
+WIKI_TOPICS = ["python", "black hole", "solar system", "jupiter", "photosynthesis",
+               "machine learning", "new york", "world war", "volcano", "galaxy"]
+
+ARTICLE_PATTERN = re.compile(
+    r"• \*\*(?P<title>.+?)\*\* \((?P<date>[\d-]+)\)\s*"
+    r"\*Source:\* (?P<source>.*?)\s*"
+    r"\*Author:\* (?P<author>.*?)\s*"
+    r"\*Description:\* (?P<description>.*?)\s*"
+    r"\[Read more\]\((?P<url>.*?)\)",
+    re.S
+)
+
+
+# Turn the formatted cache in news_cache/all.json back into NewsAPI articles
+def load_seed_articles(path=NEWS_SEED_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            text = json.load(file).get('data', '')
+    except (OSError, ValueError):
+        text = ''
+
+    articles = [
+        {
+            "source": {"id": None, "name": match['source']},
+            "author": match['author'],
+            "title": match['title'],
+            "description": match['description'],
+            "url": match['url'],
+            "publishedAt": f"{match['date']}T00:00:00Z"
+        }
+        for match in ARTICLE_PATTERN.finditer(text)
+    ]
+    if not articles:
+        articles = [{"title": "Stub headline", "description": "Stub description.",
+                     "url": "http://localhost/", "publishedAt": "2025-02-11T00:00:00Z"}]
+    return articles
+
+
+# Behaviour of one stand-in upstream
+class StubProfile:
+    __slots__ = ('latency_ms', 'jitter_ms', 'error_rate', 'payload_size')
+
+    def __init__(self, latency_ms=50, jitter_ms=10, error_rate=0.0, payload_size=5):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+
+
+class StubUpstream:
+    """Threaded HTTP server answering every GET through ``respond(path, query)``."""
+
+    def __init__(self, name, profile, respond, seed=0):
+        self.name = name
+        self.profile = profile
+        self.respond = respond
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    delay = stub.profile.latency_ms + stub.rng.uniform(
+                        -stub.profile.jitter_ms, stub.profile.jitter_ms)
+                    fail = stub.rng.random() < stub.profile.error_rate
+                time.sleep(max(delay, 0) / 1000)
+
+                if fail:
+                    status, payload = 500, {"status": "error", "message": "stubbed failure"}
+                else:
+                    parsed = urllib.parse.urlsplit(self.path)
+                    status, payload = stub.respond(parsed.path, urllib.parse.parse_qs(parsed.query))
+
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def news_responder(profile, articles):
+    def respond(path, query):
+        count = profile.payload_size
+        return 200, {
+            "status": "ok",
+            "totalResults": count,
+            "articles": [articles[i % len(articles)] for i in range(count)]
+        }
+    return respond
+
+
+def wikipedia_responder(profile, articles):
+    filler = ' '.join(article.get('description') or '' for article in articles) or "Lorem ipsum."
+
+    def respond(path, query):
+        topic = urllib.parse.unquote(path.rsplit('/', 1)[-1])
+        if topic.startswith('missing'):
+            return 404, {"type": "not_found", "title": "Not found."}
+        extract = (filler * (profile.payload_size // len(filler) + 1))[:profile.payload_size]
+        return 200, {"title": topic.title(), "description": f"Stub page for {topic}",
+                     "extract": extract}
+    return respond
+
+
+# Run appserver.py from a scratch directory so /train never touches lib/data
+def start_appserver(port, env_overrides, workdir):
+    data_dir = os.path.join(workdir, 'lib', 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    if os.path.exists(TRAINING_DATA_FILE):
+        shutil.copy(TRAINING_DATA_FILE, data_dir)
+
+    env = dict(os.environ, PORT=str(port), **env_overrides)
+    env.pop('FLASK_ENV', None)
+    log = open(os.path.join(workdir, 'appserver.out'), 'wb')
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, 'appserver.py')],
+                               cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, log
+
+
+def wait_until_healthy(base_url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"appserver exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"appserver did not become healthy within {timeout}s")
+
+
+def post_json(url, payload, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+
+
+# Map an upstream fallback message back to an error for reporting
+UPSTREAM_FAILURE_MARKERS = ("couldn't fetch", "timed out", "unexpected error", "No news articles")
+
+
+def make_request(kind, rng, args):
+    if kind == 'news':
+        return '/chat', {"query": rng.choice(["latest news", "business news", "news today"])}
+    if kind == 'wikipedia':
+        topic = rng.choice(WIKI_TOPICS)
+        if rng.random() < args.wiki_missing_rate:
+            topic = f"missing {rng.randrange(args.wiki_topics)}"
+        elif args.wiki_topics > len(WIKI_TOPICS):
+            topic = f"{topic} {rng.randrange(args.wiki_topics)}"
+        return '/chat', {"query": f"wikipedia {topic}"}
+    if kind == 'local':
+        return '/chat', {"query": rng.choice(["hello", "how are you", "what is your name", "thanks"])}
+    return '/train', {"query": f"load test question {rng.randrange(10 ** 9)}",
+                      "response": "load test answer"}
+
+
+def run_load(base_url, args):
+    rng = random.Random(args.seed)
+    mix = {'news': args.news, 'wikipedia': args.wiki, 'local': args.local, 'train': args.train}
+    kinds = [kind for kind, weight in mix.items() if weight > 0]
+    weights = [mix[kind] for kind in kinds]
+    plan = [make_request(kind, rng, args) + (kind,)
+            for kind in rng.choices(kinds, weights, k=args.requests)]
+
+    results = defaultdict(lambda: {"latencies": [], "errors": 0})
+    lock = threading.Lock()
+
+    def fire(item):
+        path, payload, kind = item
+        started = time.perf_counter()
+        try:
+            status, body = post_json(base_url + path, payload, args.timeout)
+        except Exception:
+            status, body = 0, {}
+        elapsed = time.perf_counter() - started
+
+        source = body.get('source', kind) if status == 200 else kind
+        failed = status != 200 or any(marker in str(body.get('response', ''))
+                                      for marker in UPSTREAM_FAILURE_MARKERS)
+        with lock:
+            results[source]["latencies"].append(elapsed)
+            results[source]["errors"] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(fire, plan))
+    return results, time.perf_counter() - started
+
+
+def report(results, wall_time, stubs):
+    print(f"\n{'source':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    total = 0
+    for source in sorted(results):
+        latencies = sorted(results[source]["latencies"])
+        count = len(latencies)
+        total += count
+        print(f"{source:<10} {count:>8} {count / wall_time:>8.1f} "
+              f"{percentile(latencies, 0.50) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} "
+              f"{results[source]['errors'] / count:>7.1%}")
+    print(f"{'total':<10} {total:>8} {total / wall_time:>8.1f}   wall time {wall_time:.1f}s")
+    print("upstream requests: " + ', '.join(f"{stub.name}={stub.requests}" for stub in stubs))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help="appserver upstream cache TTL in seconds, failures included; "
+                             "0 disables caching (default: the server's own TTLs)")
+
+    mix = parser.add_argument_group('traffic mix (relative weights)')
+    mix.add_argument('--news', type=float, default=1)
+    mix.add_argument('--wiki', type=float, default=2)
+    mix.add_argument('--local', type=float, default=6)
+    mix.add_argument('--train', type=float, default=1)
+    mix.add_argument('--wiki-topics', type=int, default=len(WIKI_TOPICS),
+                     help="distinct topics; raise it to defeat the Wikipedia cache")
+    mix.add_argument('--wiki-missing-rate', type=float, default=0.0,
+                     help="share of Wikipedia requests for topics the stub 404s")
+
+    for name, latency, payload, payload_help in (
+            ('news', 80, 5, "articles per response"),
+            ('wiki', 60, 800, "extract length in characters")):
+        group = parser.add_argument_group(f'{name} stub')
+        group.add_argument(f'--{name}-latency-ms', type=float, default=latency)
+        group.add_argument(f'--{name}-jitter-ms', type=float, default=latency / 4)
+        group.add_argument(f'--{name}-error-rate', type=float, default=0.0)
+        group.add_argument(f'--{name}-payload', type=int, default=payload, help=payload_help)
+    return parser.parse_args()
+
+
+def stub_profile(args, name):
+    return StubProfile(getattr(args, f'{name}_latency_ms'), getattr(args, f'{name}_jitter_ms'),
+                       getattr(args, f'{name}_error_rate'), getattr(args, f'{name}_payload'))
+
+
+def main():
+    args = parse_args()
+    articles = load_seed_articles()
+
+    news_profile = stub_profile(args, 'news')
+    wiki_profile = stub_profile(args, 'wiki')
+    stubs = [
+        StubUpstream('news', news_profile, news_responder(news_profile, articles), args.seed).start(),
+        StubUpstream('wikipedia', wiki_profile, wikipedia_responder(wiki_profile, articles),
+                     args.seed + 1).start(),
+    ]
+    env = {
+        'NEWS_API_BASE_URL': stubs[0].base_url,
+        'WIKIPEDIA_API_BASE_URL': stubs[1].base_url,
+    }
+    if args.cache_ttl is not None:
+        env['CACHE_TTL_SECONDS'] = str(args.cache_ttl)
+        env['NEGATIVE_CACHE_TTL_SECONDS'] = str(min(args.cache_ttl, 60))
+    for key, value in env.items():
+        print(f"{key}={value}")
+
+    workdir = tempfile.mkdtemp(prefix='voicebot-loadtest-')
+    base_url = f"http://127.0.0.1:{args.port}"
+    process, log = start_appserver(args.port, env, workdir)
+    try:
+        wait_until_healthy(base_url, process, args.startup_timeout)
+        results, wall_time = run_load(base_url, args)
+        report(results, wall_time, stubs)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        for stub in stubs:
+            stub.stop()
+        print(f"appserver output kept in {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from latency_stats import percentile
+from loadtest import (NEWS_SEED_FILE, StubProfile, StubUpstream, load_seed_articles,
+                      news_responder, wikipedia_responder)
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def start_stub():
+    stubs = []
+
+    def start(name, profile, responder, seed=0):
+        articles = load_seed_articles()
+        stub = StubUpstream(name, profile, responder(profile, articles), seed).start()
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.stop()
+
+
+def test_seed_articles_parse_every_cached_headline():
+    with open(NEWS_SEED_FILE, encoding='utf-8') as f:
+        expected = json.load(f)['data'].count('[Read more](')
+
+    articles = load_seed_articles()
+    assert expected and len(articles) == expected
+    assert articles[0]['title'].startswith("Heavy Rains Could Trigger Mudslides")
+    assert articles[0]['source']['name'] == "Gizmodo.com"
+    assert articles[0]['publishedAt'] == "2025-02-11T00:00:00Z"
+    for article in articles:
+        assert article['title'] and article['url'].startswith('http')
+        assert '*Source:*' not in article['description']
+
+
+def test_seed_articles_fall_back_when_cache_is_missing(tmp_path):
+    articles = load_seed_articles(str(tmp_path / 'missing.json'))
+    assert len(articles) == 1 and articles[0]['title'] == "Stub headline"
+
+
+@pytest.mark.parametrize("fraction, expected", [
+    (0.0, 1), (0.07, 7), (0.5, 50), (0.95, 95), (0.99, 99), (1.0, 100),
+])
+def test_percentile_is_nearest_rank(fraction, expected):
+    assert percentile(list(range(1, 101)), fraction) == expected
+
+
+def test_percentile_of_small_samples():
+    assert percentile([], 0.95) == 0.0
+    assert percentile([7], 0.5) == 7
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.95) == 4
+
+
+@pytest.mark.parametrize("error_rate, low, high", [(0.0, 0, 0), (1.0, 100, 100), (0.3, 15, 45)])
+def test_stub_error_rate(start_stub, error_rate, low, high):
+    profile = StubProfile(latency_ms=0, jitter_ms=0, error_rate=error_rate)
+    stub = start_stub('news', profile, news_responder, seed=1)
+
+    statuses = [fetch(f"{stub.base_url}/top-headlines?q=x")[0] for _ in range(100)]
+    assert set(statuses) <= {200, 500}
+    assert low <= statuses.count(500) <= high
+    assert stub.requests == 100
+
+
+def test_news_stub_payload_size(start_stub):
+    stub = start_stub('news', StubProfile(latency_ms=0, jitter_ms=0, payload_size=42), news_responder)
+    status, payload = fetch(f"{stub.base_url}/everything?q=nasa")
+    assert status == 200
+    assert payload['totalResults'] == len(payload['articles']) == 42
+
+
+def test_wikipedia_stub_payload_size_and_missing_topics(start_stub):
+    stub = start_stub('wikipedia', StubProfile(latency_ms=0, jitter_ms=0, payload_size=2500),
+                      wikipedia_responder)
+    status, payload = fetch(f"{stub.base_url}/page/summary/black%20hole")
+    assert status == 200
+    assert payload['title'] == "Black Hole"
+    assert len(payload['extract']) == 2500
+
+    status, _ = fetch(f"{stub.base_url}/page/summary/missing%203")
+    assert status == 404
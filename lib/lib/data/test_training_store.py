@@ -0,0 +1,156 @@
+import io
+import json
+import random
+
+import pytest
+
+import training_store
+from training_store import TrainingStore
+
+ENTRIES = [
+    {"query": "hello there", "response": "Hi!"},
+    {"query": "how are you", "response": "Fine."},
+    {"query": "hello you", "response": "Hi!", "source": "user"},
+    {"query": "what is your name", "response": "Bot."},
+    {"query": "", "response": "Empty."},
+]
+
+
+# The per-entry loop /chat used before TrainingStore
+def reference_best_match(entries, query_tokens):
+    best_match = None
+    max_similarity = 0
+    for entry in entries:
+        similarity = len(set(entry['query'].split()) & set(query_tokens))
+        if similarity > max_similarity:
+            max_similarity = similarity
+            best_match = entry
+    return best_match, max_similarity
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        if training_store.np is None:
+            pytest.skip("numpy is not installed")
+    else:
+        monkeypatch.setattr(training_store, 'np', None)
+    return request.param
+
+
+def as_dict(match):
+    entry, similarity = match
+    return (entry.to_dict() if entry else None), similarity
+
+
+@pytest.mark.parametrize("query_tokens", [
+    {"hello"},
+    {"hello", "you"},
+    {"you"},           # tie between three entries: earliest wins
+    {"name", "your"},
+    {"unknown"},       # no overlap
+    set(),
+])
+def test_best_match_agrees_with_reference_loop(backend, query_tokens):
+    store = TrainingStore.from_entries(ENTRIES)
+    assert as_dict(store.best_match(query_tokens)) == reference_best_match(ENTRIES, query_tokens)
+
+
+def test_tie_goes_to_earliest_entry(backend):
+    store = TrainingStore.from_entries(ENTRIES)
+    entry, similarity = store.best_match({"you"})
+    assert entry.query == "how are you"
+    assert similarity == 1
+
+
+def test_no_overlap_returns_none(backend):
+    store = TrainingStore.from_entries(ENTRIES)
+    assert store.best_match({"zebra"}) == (None, 0)
+    assert TrainingStore().best_match({"hello"}) == (None, 0)
+
+
+def test_backends_agree_on_random_data(monkeypatch):
+    if training_store.np is None:
+        pytest.skip("numpy is not installed")
+    rng = random.Random(7)
+    words = [f"w{i}" for i in range(40)]
+    entries = [{"query": ' '.join(rng.choices(words, k=rng.randint(0, 6))), "response": f"r{i % 9}"}
+               for i in range(500)]
+    store = TrainingStore.from_entries(entries)
+    queries = [set(rng.choices(words, k=rng.randint(1, 5))) for _ in range(50)]
+
+    with_numpy = [as_dict(store.best_match(query)) for query in queries]
+    monkeypatch.setattr(training_store, 'np', None)
+    without_numpy = [as_dict(store.best_match(query)) for query in queries]
+
+    assert with_numpy == without_numpy
+    assert with_numpy == [reference_best_match(entries, query) for query in queries]
+
+
+def test_to_list_round_trips_extra_keys():
+    store = TrainingStore.from_entries(ENTRIES)
+    assert store.to_list() == ENTRIES
+    assert store[2]['source'] == "user"
+    assert len(store) == len(ENTRIES)
+
+
+def test_responses_are_deduplicated():
+    store = TrainingStore.from_entries(ENTRIES)
+    assert store[0].response is store[2].response
+
+
+def test_append_tokenizes_once_with_custom_tokenizer():
+    calls = []
+
+    def tokenize(text):
+        calls.append(text)
+        return text.upper()
+
+    store = TrainingStore.from_entries(ENTRIES[:2], tokenize=tokenize)
+    store.best_match({"HELLO"})
+    store.best_match({"HOW"})
+    assert calls == ["hello there", "how are you"]
+    assert store.best_match({"HELLO"})[0].query == "hello there"
+
+
+@pytest.mark.parametrize("column", ['_token_ids', '_token_owners', '_token_offsets',
+                                    '_query_ids', '_response_ids'])
+def test_rejected_append_leaves_store_consistent(backend, column):
+    store = TrainingStore.from_entries(ENTRIES[:2])
+
+    with pytest.raises(TypeError):
+        store.append({"query": "bad", "response": ["not", "a", "string"]})
+    assert len(store) == 2
+
+    # Resizing an array with an exported buffer fails part-way through append
+    view = memoryview(getattr(store, column))
+    with pytest.raises(BufferError):
+        store.append({"query": "hello again", "response": "Hi!"})
+    view.release()
+
+    assert len(store) == 2
+    assert store.best_match({"hello"})[0].query == "hello there"
+    store.append({"query": "hello hello again", "response": "Again!"})
+    assert store.best_match({"hello", "again"})[0].query == "hello hello again"
+
+
+def test_write_json_streams_a_loadable_array():
+    store = TrainingStore.from_entries(ENTRIES)
+    file = io.StringIO()
+    store.write_json(file)
+    assert json.loads(file.getvalue()) == ENTRIES
+
+    empty = io.StringIO()
+    TrainingStore().write_json(empty)
+    assert json.loads(empty.getvalue()) == []
+
+
+def test_iteration_does_not_block_appends():
+    store = TrainingStore.from_entries(ENTRIES[:2])
+    seen = []
+    for entry in store:
+        seen.append(entry.query)
+        # Would deadlock if iteration held the lock
+        store.append({"query": f"added {len(seen)}", "response": "Added."})
+    assert seen == ["hello there", "how are you"]
+    assert len(store) == 4
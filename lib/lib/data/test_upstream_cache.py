@@ -0,0 +1,95 @@
+import threading
+
+from upstream_cache import TTLCache, canonical_key, negative_key
+
+
+def test_canonical_key_folds_case_spacing_and_word_order():
+    assert canonical_key("New  York ") == canonical_key("york new") == "new york"
+    assert canonical_key("Python!") == "python"
+
+
+def test_negative_entry_is_shared_across_word_order():
+    cache = TTLCache()
+    cache.set_negative("york new", "failed")
+    assert cache.get(canonical_key("New York"), negative_key("New York")) == "failed"
+
+
+def test_positive_entry_wins_over_negative():
+    cache = TTLCache()
+    cache.set_negative("new york", "failed")
+    cache.set(canonical_key("New York"), "summary")
+    assert cache.get(canonical_key("york new"), negative_key("york new")) == "summary"
+
+
+def test_negative_entries_expire_sooner(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('upstream_cache.time.time', lambda: now[0])
+    cache = TTLCache(ttl_seconds=600)
+    cache.set(canonical_key("jupiter"), "summary")
+    cache.set_negative("plumbus", "failed")
+
+    now[0] += 120
+    assert cache.get(negative_key("plumbus")) is None
+    assert cache.get(canonical_key("jupiter")) == "summary"
+    assert cache.stats() == {"size": 1, "hits": 1, "negative_hits": 0, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_negative_hits_do_not_count_as_hits():
+    cache = TTLCache()
+    cache.set_negative("plumbus", "failed")
+    cache.set(canonical_key("jupiter"), "summary")
+    cache.get(negative_key("plumbus"))
+    cache.get(canonical_key("jupiter"))
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_cache_size_is_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('upstream_cache.time.time', lambda: now[0])
+    cache = TTLCache(max_entries=100)
+    for i in range(50):
+        cache.set_negative(f"garbage {i}", "failed")
+    now[0] += 120
+    # Expired negative entries are purged once the cache fills up
+    for i in range(100):
+        cache.set(canonical_key(f"topic {i}"), "summary")
+    assert len(cache.cache) <= 100
+    assert not any(isinstance(key, tuple) for key in cache.cache)
+
+    for i in range(1000):
+        cache.set(canonical_key(f"other {i}"), "summary")
+    assert len(cache.cache) <= 100
+    assert cache.get(canonical_key("other 999")) == "summary"
+
+
+def test_concurrent_expiry_never_raises():
+    cache = TTLCache(ttl_seconds=0)
+    errors = []
+
+    def worker(seed):
+        try:
+            for i in range(2000):
+                key = canonical_key(f"topic {(seed + i) % 5}")
+                cache.set(key, "summary")
+                cache.get(key, negative_key(key))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_negative_ttl_is_configurable(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('upstream_cache.time.time', lambda: now[0])
+    cache = TTLCache(ttl_seconds=0, negative_ttl_seconds=0)
+    cache.set(canonical_key("jupiter"), "summary")
+    cache.set_negative("plumbus", "failed")
+    assert cache.get(canonical_key("jupiter"), negative_key("plumbus")) is None
+    assert cache.get(negative_key("plumbus")) is None
@@ -0,0 +1,206 @@
+from array import array
+import json
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, matching falls back to pure Python
+    np = None
+
+# Typecode for the id/offset columns (unsigned 32-bit on all supported platforms)
+ID_TYPECODE = 'I'
+
+
+# Deduplicating string table: each distinct string is stored once and
+# referenced everywhere else by its integer id
+class StringTable:
+    __slots__ = ('_ids', '_strings')
+
+    def __init__(self):
+        self._ids = {}
+        self._strings = []
+
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+
+    def lookup(self, value):
+        return self._ids.get(value)
+
+    def __getitem__(self, string_id):
+        return self._strings[string_id]
+
+    def __len__(self):
+        return len(self._strings)
+
+
+# Lightweight view of a single training entry, built on demand
+class TrainingEntry:
+    __slots__ = ('query', 'response', 'extra')
+
+    def __init__(self, query, response, extra=None):
+        self.query = query
+        self.response = response
+        self.extra = extra
+
+    def __getitem__(self, key):
+        if key == 'query':
+            return self.query
+        if key == 'response':
+            return self.response
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def to_dict(self):
+        entry = {"query": self.query, "response": self.response}
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+
+# Column-oriented training data store.
+#
+# Queries and responses are interned in a shared string table and referenced
+# by id from two array columns. The preprocessed token set of every query is
+# computed once on append and kept as interned token ids in a flat array with
+# per-entry offsets, so matching never re-tokenizes the stored queries.
+# A parallel owner column maps every token back to its entry for numpy.
+#
+# The server answers requests on several threads, so appends and matches are
+# serialized: resizing an array while numpy views it raises BufferError.
+class TrainingStore:
+    __slots__ = ('_tokenize', '_strings', '_vocab', '_query_ids', '_response_ids',
+                 '_token_ids', '_token_owners', '_token_offsets', '_extras', '_lock')
+
+    def __init__(self, tokenize=str):
+        self._tokenize = tokenize
+        self._strings = StringTable()
+        self._vocab = StringTable()
+        self._query_ids = array(ID_TYPECODE)
+        self._response_ids = array(ID_TYPECODE)
+        self._token_ids = array(ID_TYPECODE)
+        self._token_owners = array(ID_TYPECODE)
+        self._token_offsets = array(ID_TYPECODE, [0])
+        # Sparse storage for the rare entries carrying keys besides query/response
+        self._extras = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_entries(cls, entries, tokenize=str):
+        store = cls(tokenize)
+        for entry in entries:
+            store.append(entry)
+        return store
+
+    def append(self, entry):
+        query, response = entry['query'], entry['response']
+        if not isinstance(query, str) or not isinstance(response, str):
+            raise TypeError("training entry query and response must be strings")
+        tokens = dict.fromkeys(self._tokenize(query).split())
+        extra = {key: value for key, value in entry.items() if key not in ('query', 'response')}
+
+        with self._lock:
+            # Intern everything first so the columns are only written once
+            # nothing else can fail
+            query_id = self._strings.intern(query)
+            response_id = self._strings.intern(response)
+            token_ids = sorted(self._vocab.intern(token) for token in tokens)
+            index = len(self._query_ids)
+            token_count = len(self._token_ids)
+            try:
+                self._token_ids.extend(token_ids)
+                self._token_owners.extend([index] * len(token_ids))
+                self._token_offsets.append(token_count + len(token_ids))
+                self._query_ids.append(query_id)
+                self._response_ids.append(response_id)
+            except BaseException:
+                del self._token_ids[token_count:]
+                del self._token_owners[token_count:]
+                del self._token_offsets[index + 1:]
+                del self._query_ids[index:]
+                del self._response_ids[index:]
+                raise
+            if extra:
+                self._extras[index] = extra
+
+    def __len__(self):
+        return len(self._query_ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("training entry index out of range")
+        return TrainingEntry(
+            self._strings[self._query_ids[index]],
+            self._strings[self._response_ids[index]],
+            self._extras.get(index)
+        )
+
+    def __iter__(self):
+        # Columns only ever grow, so entries below the length seen here stay
+        # valid while appends continue; iterating never holds the lock
+        with self._lock:
+            count = len(self._query_ids)
+        for index in range(count):
+            yield self[index]
+
+    def to_list(self):
+        return [entry.to_dict() for entry in self]
+
+    def write_json(self, file):
+        """Stream the entries to ``file`` as a JSON array, one entry per line,
+        without building the whole list in memory."""
+        separator = '\n    '
+        file.write('[')
+        for entry in self:
+            file.write(separator)
+            file.write(json.dumps(entry.to_dict()))
+            separator = ',\n    '
+        file.write('\n]\n' if separator != '\n    ' else ']\n')
+
+    def best_match(self, query_tokens):
+        """Return (entry, similarity) for the stored query sharing the most
+        tokens with ``query_tokens``; ties go to the earliest entry and
+        ``(None, 0)`` is returned when nothing overlaps."""
+        with self._lock:
+            wanted = {self._vocab.lookup(token) for token in query_tokens}
+            wanted.discard(None)
+            if not wanted or not len(self):
+                return None, 0
+
+            if np is not None:
+                index, similarity = self._best_match_numpy(wanted)
+            else:
+                index, similarity = self._best_match_python(wanted)
+
+            if similarity == 0:
+                return None, 0
+            return self[index], similarity
+
+    def _best_match_python(self, wanted):
+        token_ids = self._token_ids
+        offsets = self._token_offsets
+        best_index, max_similarity = 0, 0
+        for index in range(len(self)):
+            similarity = 0
+            for position in range(offsets[index], offsets[index + 1]):
+                if token_ids[position] in wanted:
+                    similarity += 1
+            if similarity > max_similarity:
+                best_index, max_similarity = index, similarity
+        return best_index, max_similarity
+
+    def _best_match_numpy(self, wanted):
+        # Zero-copy views over the array columns, only alive while the lock is held
+        token_ids = np.frombuffer(self._token_ids, dtype=np.uint32)
+        owners = np.frombuffer(self._token_owners, dtype=np.uint32)
+        hits = np.isin(token_ids, np.fromiter(wanted, dtype=np.uint32, count=len(wanted)))
+        similarities = np.bincount(owners[hits], minlength=len(self))
+        best_index = int(similarities.argmax())
+        return best_index, int(similarities[best_index])
@@ -0,0 +1,90 @@
+import itertools
+import re
+import threading
+import time
+
+# Failures and empty upstream results are only remembered briefly
+NEGATIVE_TTL_SECONDS = 60
+
+
+# Case-fold, drop punctuation and collapse whitespace: "Python " -> "python"
+def normalize_key(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', str(text).casefold()).split())
+
+
+# Order-insensitive form of normalize_key: "York New" and "new york" collide
+def canonical_key(text):
+    return ' '.join(sorted(normalize_key(text).split()))
+
+
+# Negative entries share the canonical form but live in their own namespace;
+# lookups try the positive key first, so a failure never hides a result
+def negative_key(text):
+    return ('error', canonical_key(text))
+
+
+# Initialize caches with TTL.
+#
+# Shared by the server's request threads, so every access holds a lock.
+# Negative entries are keyed by user input, so the cache is bounded: when it
+# fills up, expired entries are purged and then the oldest tenth is evicted.
+class TTLCache:
+    def __init__(self, ttl_seconds=600, max_entries=10000, negative_ttl_seconds=NEGATIVE_TTL_SECONDS):
+        self.cache = {}
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, *keys):
+        # Keys are tried in order; a lookup counts once towards the hit ratio
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                entry = self.cache.get(key)
+                if entry is None:
+                    continue
+                data, expires_at, negative = entry
+                if now < expires_at:
+                    if negative:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return data
+                self.cache.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl_seconds=None, negative=False):
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self.cache.pop(key, None)
+            if len(self.cache) >= self.max_entries:
+                self._evict()
+            self.cache[key] = (value, time.time() + ttl, negative)
+
+    def set_negative(self, text, value):
+        self.set(negative_key(text), value, self.negative_ttl, negative=True)
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, entry in self.cache.items() if entry[1] <= now]:
+            del self.cache[key]
+        overflow = len(self.cache) - self.max_entries + max(1, self.max_entries // 10)
+        for key in list(itertools.islice(self.cache, max(overflow, 0))):
+            del self.cache[key]
+
+    def stats(self):
+        # Cached failures are reported separately so they don't inflate hit_ratio
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self.cache),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,280 @@
+import importlib
+import json
+import os
+import sys
+import types
+import wave
+
+import pytest
+
+TRAINING_DATA = [
+    {"query": "hello", "response": "Hi! How can I help you today?"},
+    {"query": "what is your name", "response": "I'm a voice chatbot assistant, nice to meet you!"},
+]
+
+
+class WaitTimeoutError(Exception):
+    pass
+
+
+class UnknownValueError(Exception):
+    pass
+
+
+class AudioFile:
+    opened = []
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        AudioFile.opened.append(self.path)
+        # speech_recognition raises ValueError for files it cannot decode
+        try:
+            wave.open(self.path, 'rb').close()
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Audio file could not be read: {e}")
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Recognizer:
+    def adjust_for_ambient_noise(self, source, duration=1):
+        raise AssertionError("replay must not calibrate")
+
+    def listen(self, source, timeout=None):
+        return source.path
+
+    google_calls = []
+
+    def recognize_google(self, audio):
+        Recognizer.google_calls.append(audio)
+        raise RuntimeError("replay with transcripts must not call Google")
+
+
+def pyttsx3_init():
+    raise AssertionError("replay without --synthesize-to must not open an audio device")
+
+
+# Stand-ins for the audio, NLP and HTTP dependencies so the bot imports headless
+@pytest.fixture
+def chatbot_api(monkeypatch):
+    sr = types.ModuleType('speech_recognition')
+    sr.Recognizer = Recognizer
+    sr.AudioFile = AudioFile
+    sr.WaitTimeoutError = WaitTimeoutError
+    sr.UnknownValueError = UnknownValueError
+
+    pyttsx3 = types.ModuleType('pyttsx3')
+    pyttsx3.init = pyttsx3_init
+
+    requests = types.ModuleType('requests')
+    requests.exceptions = types.SimpleNamespace(RequestException=Exception)
+
+    nltk = types.ModuleType('nltk')
+    nltk.data = types.SimpleNamespace(find=lambda name: None)
+    nltk.download = lambda name: None
+    corpus = types.ModuleType('nltk.corpus')
+    corpus.stopwords = types.SimpleNamespace(words=lambda language: ['is', 'the', 'a'])
+    tokenize = types.ModuleType('nltk.tokenize')
+    tokenize.word_tokenize = str.split
+
+    textblob = types.ModuleType('textblob')
+    textblob.TextBlob = lambda text: types.SimpleNamespace(correct=lambda: text)
+
+    stubs = {'speech_recognition': sr, 'pyttsx3': pyttsx3, 'requests': requests, 'nltk': nltk,
+             'nltk.corpus': corpus, 'nltk.tokenize': tokenize, 'textblob': textblob}
+    for name, module in stubs.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, 'chatbot_api', raising=False)
+    AudioFile.opened = []
+    Recognizer.google_calls = []
+    yield importlib.import_module('chatbot_api')
+    sys.modules.pop('chatbot_api', None)
+
+
+def write_recordings(directory, transcripts):
+    os.makedirs(directory)
+    paths = []
+    for index, transcript in enumerate(transcripts):
+        path = os.path.join(directory, f"{index:03d}.wav")
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(b'\0\0' * 1600)
+        with open(os.path.splitext(path)[0] + '.txt', 'w') as f:
+            f.write(transcript)
+        paths.append(path)
+    return paths
+
+
+def snapshot(directory):
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                files[path] = f.read()
+    return files
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    directory = tmp_path / 'work'
+    (directory / 'lib' / 'data').mkdir(parents=True)
+    (directory / 'lib' / 'data' / 'sample_data.json').write_text(json.dumps(TRAINING_DATA))
+    monkeypatch.chdir(directory)
+    return directory
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_tracer_writes_one_json_line_per_turn(chatbot_api, tmp_path):
+    path = tmp_path / 'turns.jsonl'
+    tracer = chatbot_api.TurnTracer(str(path))
+    for _ in range(2):
+        tracer.start_turn()
+        with tracer.span('capture'):
+            pass
+        with tracer.span('speak'):
+            pass
+        tracer.end_turn()
+    tracer.close()
+
+    records = read_jsonl(path)
+    assert [record["turn"] for record in records] == [1, 2]
+    for record in records:
+        assert [span["stage"] for span in record["spans"]] == ['capture', 'speak']
+        assert all(span["duration_ms"] >= 0 for span in record["spans"])
+        assert record["total_ms"] >= sum(span["duration_ms"] for span in record["spans"])
+    assert tracer.summary()["capture"]["count"] == 2
+
+
+def test_tracer_writes_chrome_trace(chatbot_api, tmp_path):
+    path = tmp_path / 'turns.json'
+    tracer = chatbot_api.TurnTracer(str(path), 'chrome')
+    tracer.start_turn()
+    with tracer.span('recognize'):
+        pass
+    tracer.end_turn()
+    tracer.close()
+
+    with open(path) as f:
+        events = json.load(f)["traceEvents"]
+    assert len(events) == 1
+    event = events[0]
+    assert event["name"] == 'recognize'
+    assert event["ph"] == 'X'
+    assert event["args"] == {"turn": 1, "error": False}
+    assert event["ts"] >= 0 and event["dur"] >= 0
+
+
+def test_disabled_tracer_records_nothing(chatbot_api):
+    tracer = chatbot_api.TurnTracer()
+    tracer.start_turn()
+    with tracer.span('capture'):
+        pass
+    tracer.end_turn()
+    assert tracer.summary() == {}
+
+
+def test_replay_runs_one_turn_per_recording_without_writes(chatbot_api, workdir, tmp_path, capsys):
+    recordings = write_recordings(str(tmp_path / 'recordings'),
+                                  ["hello", "unknown gibberish", "what is your name"])
+    before = snapshot(str(workdir))
+    trace_path = tmp_path / 'turns.jsonl'
+    tracer = chatbot_api.TurnTracer(str(trace_path), enabled=True)
+
+    chatbot_api.ReplayChatbot(recordings, tracer, use_transcripts=True).run()
+    tracer.close()
+
+    assert AudioFile.opened == recordings
+    records = read_jsonl(trace_path)
+    assert len(records) == len(recordings)
+    for record in records:
+        stages = [span["stage"] for span in record["spans"]]
+        assert stages == ['capture', 'recognize', 'process_query', 'speak']
+    assert snapshot(str(workdir)) == before
+
+    output = capsys.readouterr().out
+    assert "Bot: I'm not sure how to respond to that." in output
+    assert "Bot: I'm a voice chatbot assistant" in output
+
+
+def test_replay_goodbye_ends_the_session_like_live(chatbot_api, workdir, tmp_path):
+    recordings = write_recordings(str(tmp_path / 'recordings'), ["hello", "goodbye", "hello"])
+    trace_path = tmp_path / 'turns.jsonl'
+    tracer = chatbot_api.TurnTracer(str(trace_path))
+
+    chatbot_api.ReplayChatbot(recordings, tracer, use_transcripts=True).run()
+
+    assert AudioFile.opened == recordings[:2]
+    assert len(read_jsonl(trace_path)) == 2
+
+
+def test_replay_does_not_create_training_data(chatbot_api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    bot = chatbot_api.ReplayChatbot([])
+    bot.run()
+    assert bot.training_data
+    assert os.listdir(tmp_path) == []
+
+
+def test_corrupt_recording_ends_only_its_own_turn(chatbot_api, workdir, tmp_path, capsys):
+    recordings = write_recordings(str(tmp_path / 'recordings'), ["hello", "hello", "what is your name"])
+    with open(recordings[1], 'wb') as f:
+        f.write(b'not a wav file')
+    trace_path = tmp_path / 'turns.jsonl'
+    tracer = chatbot_api.TurnTracer(str(trace_path))
+
+    chatbot_api.ReplayChatbot(recordings, tracer, use_transcripts=True).run()
+
+    records = read_jsonl(trace_path)
+    assert len(records) == 3
+    assert records[1]["spans"] == []
+    assert [span["stage"] for span in records[2]["spans"]][-1] == 'speak'
+    assert f"Error reading recording {recordings[1]}" in capsys.readouterr().out
+
+
+def test_missing_transcript_is_an_error_not_a_google_call(chatbot_api, workdir, tmp_path):
+    recordings = write_recordings(str(tmp_path / 'recordings'), ["hello", "hello"])
+    os.remove(os.path.splitext(recordings[0])[0] + '.txt')
+    trace_path = tmp_path / 'turns.jsonl'
+    tracer = chatbot_api.TurnTracer(str(trace_path))
+
+    chatbot_api.ReplayChatbot(recordings, tracer, use_transcripts=True).run()
+
+    assert Recognizer.google_calls == []
+    first, second = read_jsonl(trace_path)
+    recognize = [span for span in first["spans"] if span["stage"] == 'recognize']
+    assert recognize and recognize[0]["error"] is True
+    assert 'process_query' not in [span["stage"] for span in first["spans"]]
+    assert 'process_query' in [span["stage"] for span in second["spans"]]
+
+
+def test_chrome_trace_marks_failed_spans(chatbot_api, tmp_path):
+    path = tmp_path / 'turns.json'
+    tracer = chatbot_api.TurnTracer(str(path), 'chrome')
+    tracer.start_turn()
+    with pytest.raises(RuntimeError):
+        with tracer.span('recognize'):
+            raise RuntimeError("offline")
+    tracer.end_turn()
+    tracer.close()
+
+    with open(path) as f:
+        event, = json.load(f)["traceEvents"]
+    assert event["args"] == {"turn": 1, "error": True}
+
+
+def test_tracer_summary_uses_nearest_rank_p95(chatbot_api):
+    tracer = chatbot_api.TurnTracer(enabled=True)
+    tracer.durations['recognize'] = [float(ms) for ms in range(20, 0, -1)]
+    # Nearest rank of 0.95 * 20 is the 19th value, not the maximum
+    assert tracer.summary()['recognize'] == {"count": 20, "mean_ms": 10.5, "p95_ms": 19.0}